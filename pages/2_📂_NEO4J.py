@@ -1,7 +1,9 @@
 import streamlit as st
-from neo4j import GraphDatabase 
+from neo4j import GraphDatabase, AsyncGraphDatabase
+import asyncio
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -24,51 +26,75 @@ except ImportError as e:
         "bolt+ssc://8871b289.databases.neo4j.io:7687"
     ]
 
-def test_neo4j_connection(uri=None):
-    """Test Neo4j connection with given URI or default"""
-    if uri is None:
-        uri = NEO4J_URI
-    
+async def probe_neo4j_uri(uri):
+    """Verify connectivity to a single URI with the async driver"""
+    async with AsyncGraphDatabase.driver(uri, auth=(NEO4J_USER, NEO4J_PASS), connection_timeout=3) as driver:
+        await driver.verify_connectivity()
+    return uri
+
+async def race_neo4j_uris(uris):
+    """Return the first URI that connects, plus the errors seen before it"""
+    tasks = {asyncio.ensure_future(probe_neo4j_uri(uri)): uri for uri in uris}
+    errors = {}
+    pending = set(tasks)
     try:
-        driver = GraphDatabase.driver(uri, auth=(NEO4J_USER, NEO4J_PASS))
-        with driver.session() as session:
-            result = session.run("RETURN 'Connection Test Successful!' AS msg")
-            msg = result.single()["msg"]
-        driver.close()
-        return True, msg
-    except Exception as e:
-        return False, str(e)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), errors
+                errors[tasks[task]] = str(task.exception())
+    finally:
+        # Cancel the slower probes and let their drivers close
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return None, errors
 
 def find_working_connection():
-    """Try multiple connection URIs to find one that works"""
+    """Probe all connection URIs concurrently and return the first one that works"""
     st.info("🔌 Testing multiple connection methods...")
     
-    # Try the main URI first
-    success, msg = test_neo4j_connection(NEO4J_URI)
-    if success:
-        st.success(f"✅ Main URI works: {NEO4J_URI}")
-        return NEO4J_URI, True
+    # Main URI plus alternatives, without duplicates
+    uris = list(dict.fromkeys([NEO4J_URI] + NEO4J_ALTERNATIVE_URIS))
+    working_uri, errors = asyncio.run(race_neo4j_uris(uris))
     
-    # Try alternative URIs
-    for alt_uri in NEO4J_ALTERNATIVE_URIS:
-        if alt_uri != NEO4J_URI:
-            st.info(f"🔄 Trying: {alt_uri}")
-            success, msg = test_neo4j_connection(alt_uri)
-            if success:
-                st.success(f"✅ Alternative URI works: {alt_uri}")
-                return alt_uri, True
-            else:
-                st.warning(f"❌ {alt_uri} failed: {msg}")
+    for uri, msg in errors.items():
+        st.warning(f"❌ {uri} failed: {msg}")
+    if working_uri:
+        kind = "Main" if working_uri == NEO4J_URI else "Alternative"
+        st.success(f"✅ {kind} URI works: {working_uri}")
+        return working_uri, True
     
     return None, False
 
+POOL_WARMUP_CONNECTIONS = 4
+
+@st.cache_resource(show_spinner=False)
+def get_cached_driver(uri):
+    """Create a pooled Neo4j driver once per URI and keep it across reruns"""
+    driver = GraphDatabase.driver(
+        uri,
+        auth=(NEO4J_USER, NEO4J_PASS),
+        max_connection_pool_size=50,
+        connection_acquisition_timeout=30,
+        max_connection_lifetime=3600,
+    )
+    # Do the TLS/routing/auth handshake once, up front
+    driver.verify_connectivity()
+    # Open a few pooled connections now so the first Load Graph finds a warm pool
+    with ThreadPoolExecutor(max_workers=POOL_WARMUP_CONNECTIONS) as executor:
+        for _ in range(POOL_WARMUP_CONNECTIONS):
+            executor.submit(driver.execute_query, "RETURN 1")
+    return driver
+
 def create_neo4j_driver(uri=None):
     """Create and return a Neo4j driver"""
     if uri is None:
         uri = NEO4J_URI
     
     try:
-        return GraphDatabase.driver(uri, auth=(NEO4J_USER, NEO4J_PASS))
+        return get_cached_driver(uri)
     except Exception as e:
         st.error(f"Failed to create Neo4j driver with {uri}: {e}")
         return None
@@ -105,8 +131,7 @@ if st.button("🔌 Test Neo4j Connection"):
         st.success("✅ Connection test successful!")
         st.info(f"Working URI: {working_uri}")
         # Store the working URI for future use
-        if "working_uri" not in st.session_state:
-            st.session_state.working_uri = working_uri
+        st.session_state.working_uri = working_uri
     else:
         st.error("❌ All connection methods failed")
         st.info("💡 Check your Neo4j database settings or try again later")
@@ -120,8 +145,11 @@ if not st.session_state.neo4j_logged_in:
             if username in USERS and USERS[username] == password:
                 st.info("🔌 Attempting to connect to Neo4j...")
                 
-                # Find a working connection
-                working_uri, success = find_working_connection()
+                # Reuse a previously found URI, otherwise probe for one
+                working_uri = st.session_state.working_uri
+                success = working_uri is not None
+                if not success:
+                    working_uri, success = find_working_connection()
                 
                 if success:
                     # Create driver with working URI
@@ -1,6 +1,6 @@
 import streamlit as st
 from pyvis.network import Network
-import tempfile
+import neo4j
 
 st.title("🌐 Neo4j Graph Visualization")
 
@@ -10,59 +10,98 @@ if not st.session_state.get("neo4j_logged_in", False):
     st.stop()
 
 def run_cypher_query(query, params=None):
-    with st.session_state.neo4j_driver.session() as session:
-        result = session.run(query, params or {})
-        return [record.data() for record in result]
+    # execute_query borrows a pooled connection and retries transient errors;
+    # Result.to_df builds the DataFrame directly instead of a dict per record
+    return st.session_state.neo4j_driver.execute_query(
+        query, params or {}, database_="neo4j",
+        result_transformer_=neo4j.Result.to_df,
+    )
+
+def fetch_node_properties(node_id):
+    # Full properties are fetched on demand rather than shipped with the graph
+    props_df = run_cypher_query(
+        "MATCH (n) WHERE id(n) = $id RETURN properties(n) AS props", {"id": node_id}
+    )
+    return props_df.iloc[0]["props"] if not props_df.empty else {}
 
 # --- Load graph ---
 if st.button("Load Graph"):
     try:
-        # Fetch relationships and their connected nodes together to avoid dangling edges
-        rel_rows = run_cypher_query("""
-            MATCH (a)-[r]->(b)
-            RETURN id(a) AS source_id,
-                   labels(a) AS source_labels,
-                   properties(a) AS source_props,
-                   id(b) AS target_id,
-                   labels(b) AS target_labels,
-                   properties(b) AS target_props,
-                   type(r) AS rel_type,
-                   properties(r) AS rel_props
-            LIMIT 200
+        # One round-trip: each node is shipped once in `nodes` with just what the
+        # graph displays, edges only carry endpoint ids. Relationships and nodes
+        # without any relationship are limited separately so isolated nodes
+        # cannot use up the edge budget.
+        graph_df = run_cypher_query("""
+            CALL {
+                MATCH (a)-[r]->(b)
+                RETURN a, r, b LIMIT 200
+            }
+            WITH collect(DISTINCT a) + collect(DISTINCT b) AS endpoints,
+                 collect({
+                     source_id: id(a), target_id: id(b),
+                     rel_type: type(r), rel_props: properties(r)
+                 }) AS edges
+            CALL {
+                MATCH (o) WHERE NOT EXISTS { (o)--() }
+                WITH o LIMIT 200
+                RETURN collect(o) AS orphans
+            }
+            UNWIND endpoints + orphans AS n
+            WITH DISTINCT n, edges
+            RETURN collect({id: id(n), labels: labels(n), name: coalesce(n.name, n.id)}) AS nodes,
+                   edges
         """)
+        graph = graph_df.iloc[0] if not graph_df.empty else {"nodes": [], "edges": []}
 
         # Build Pyvis network
         net = Network(height="850px", width="100%", bgcolor="#ffffff", font_color="black", directed=True)
+        # forceAtlas2Based settles much faster than the default Barnes-Hut, and
+        # skipping the pre-render stabilization lets the graph show up at once
+        net.force_atlas_2based(gravity=-50, central_gravity=0.01, spring_length=100, damping=0.4)
+        net.toggle_stabilization(False)
 
-        added_nodes = set()
-
-        def add_node_if_needed(node_id, labels, props):
-            if node_id in added_nodes:
-                return
-            safe_props = props or {}
+        # Collect nodes keyed by id (dedups implicitly), then add them in one batch
+        nodes = {}
+        for node in graph["nodes"]:
+            labels = node.get("labels")
             label_text = ", ".join(labels) if labels else "Node"
-            display_label = safe_props.get("name") or safe_props.get("id") or label_text
-            tooltip = "<br>".join([f"{k}: {v}" for k, v in safe_props.items()]) if safe_props else ""
-            net.add_node(node_id, label=str(display_label), title=tooltip)
-            added_nodes.add(node_id)
+            display_label = str(node.get("name") or label_text)
+            tooltip = f"{label_text}: {display_label}"
+            nodes[node["id"]] = (display_label, tooltip)
 
-        # Add nodes and edges
-        for row in rel_rows:
-            src_id = row["source_id"]
-            tgt_id = row["target_id"]
-            add_node_if_needed(src_id, row.get("source_labels"), row.get("source_props"))
-            add_node_if_needed(tgt_id, row.get("target_labels"), row.get("target_props"))
+        if nodes:
+            net.add_nodes(
+                list(nodes.keys()),
+                label=[label for label, _ in nodes.values()],
+                title=[title for _, title in nodes.values()],
+            )
 
-            rel_type = row.get("rel_type")
-            rel_props = row.get("rel_props") or {}
+        # add_edges() cannot carry per-edge labels/tooltips, so edges go one by one
+        for edge in graph["edges"]:
+            rel_props = edge.get("rel_props") or {}
             rel_tooltip = "<br>".join([f"{k}: {v}" for k, v in rel_props.items()]) if rel_props else ""
-            net.add_edge(src_id, tgt_id, label=rel_type, title=rel_tooltip)
+            net.add_edge(edge["source_id"], edge["target_id"], label=edge.get("rel_type"), title=rel_tooltip)
 
-        # Save and display inside Streamlit
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".html") as tmp_file:
-            net.save_graph(tmp_file.name)
-            html_content = open(tmp_file.name, "r", encoding="utf-8").read()
-            st.components.v1.html(html_content, height=850)
+        # Render in memory and keep it so the node inspector below survives reruns
+        st.session_state.graph_html = net.generate_html(notebook=False)
+        st.session_state.graph_nodes = {node_id: label for node_id, (label, _) in nodes.items()}
 
     except Exception as e:
         st.error(f"❌ Query failed: {e}")
+
+# --- Display graph ---
+if st.session_state.get("graph_html"):
+    st.components.v1.html(st.session_state.graph_html, height=850)
+
+    graph_nodes = st.session_state.get("graph_nodes", {})
+    if graph_nodes:
+        node_id = st.selectbox(
+            "Inspect node",
+            options=list(graph_nodes),
+            format_func=lambda i: f"{graph_nodes[i]} ({i})",
+        )
+        if st.button("Show Properties"):
+            try:
+                st.json(fetch_node_properties(node_id))
+            except Exception as e:
+                st.error(f"❌ Query failed: {e}")
@@ -1,21 +1,20 @@
+import hashlib
 import io
 import json
 import os
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import streamlit_chat as st_chat
-import google.generativeai as genai
 import streamlit.components.v1 as components
 from dotenv import load_dotenv
-
-# Neo4j Driver
-try:
-    from neo4j import GraphDatabase
-    NEO4J_AVAILABLE = True
-except Exception:
-    NEO4J_AVAILABLE = False
+from pandas.io.json import ujson_loads
 
 # Load environment variables
 load_dotenv()
@@ -29,14 +28,14 @@ except ImportError:
     MOCK_API_INVENTORY = "https://68ae8e19b91dfcdd62b97c34.mockapi.io/Inventory"
     MOCK_API_CONTROLS = "https://68ae8e19b91dfcdd62b97c34.mockapi.io/ControlMapper"
 
-# Configure Google's Generative AI with your API key
-try:
+# Configure Google's Generative AI with your API key, on first use only:
+# google.generativeai pulls in grpc/protobuf, which slows every cold start
+@st.cache_resource(show_spinner=False)
+def get_chat_model():
+    import google.generativeai as genai
     genai.configure(api_key=GOOGLE_API_KEY)
-    chat_model = genai.GenerativeModel("gemini-1.5-flash")
-except Exception as e:
-    st.error(f"Failed to configure Google Generative AI: {e}")
-    st.info("Please add a valid Google API key to enable the chatbot functionality.")
-    chat_model = None
+    return genai.GenerativeModel("gemini-1.5-flash")
+
 # -----------------------------
 # Page config
 # -----------------------------
@@ -51,23 +50,104 @@ st.caption("Automates: Inventory → Scope → Controls → Remediation → Repo
 
 # --- Initialize session state for uploaded files ---
 if 'uploaded_files' not in st.session_state:
-    st.session_state['uploaded_files'] = []
+    # Keyed by content hash, in upload order, so replayed uploads are stored once
+    st.session_state['uploaded_files'] = {}
+
+def normalize_network_segment(df: pd.DataFrame) -> pd.DataFrame:
+    """Lower-cases network_segment once and stores it as a categorical."""
+    if "network_segment" in df.columns:
+        df["network_segment"] = df["network_segment"].astype(str).str.lower().astype("category")
+    return df
+
+def drop_timezones(df: pd.DataFrame) -> pd.DataFrame:
+    """Makes tz-aware datetime columns naive; Excel cannot store timezones."""
+    # By position, so a repeated column name cannot select several columns
+    for i, dtype in enumerate(df.dtypes):
+        if isinstance(dtype, pd.DatetimeTZDtype):
+            df.isetitem(i, df.iloc[:, i].dt.tz_localize(None))
+    return df
+
+def dedupe_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Renames repeated column names to a, a.1, a.2, ... like pd.read_csv does."""
+    taken = set(df.columns)
+    seen, suffixes, names = set(), {}, []
+    for name in df.columns:
+        new_name = name
+        if name in seen:
+            # Skip suffixes that clash with a column already in the file
+            k = suffixes.get(name, 1)
+            while f"{name}.{k}" in taken or f"{name}.{k}" in seen:
+                k += 1
+            suffixes[name] = k + 1
+            new_name = f"{name}.{k}"
+        seen.add(new_name)
+        names.append(new_name)
+    df.columns = names
+    return df
 
 # ------------------------------
-# Fetch inventory from MockAPI
+# Fetch inventory / controls from MockAPI
 # ------------------------------
-def fetch_inventory_from_api() -> pd.DataFrame:
-    url = MOCK_API_INVENTORY
+@st.cache_resource(show_spinner=False)
+def get_http_session() -> requests.Session:
+    # The script body re-runs on every interaction, so the pooled session lives
+    # in the resource cache rather than at module level
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    return session
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_inventory_from_api() -> pd.DataFrame:
+    # Errors propagate so a failed fetch is not cached
+    resp = get_http_session().get(MOCK_API_INVENTORY, timeout=10)
+    resp.raise_for_status()
+    data = resp.json()
+    if isinstance(data, list):
+        return normalize_network_segment(pd.json_normalize(data))
+    else:
+        return normalize_network_segment(pd.DataFrame([data]))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_controls_from_api() -> pd.DataFrame:
+    # Errors propagate so a failed fetch is not cached
+    resp = get_http_session().get(MOCK_API_CONTROLS, timeout=10)
+    resp.raise_for_status()
+    controls = pd.DataFrame(resp.json())
+    # Low-cardinality labels: compare and count on category codes, not strings
+    for col in ("req_id", "status", "title"):
+        if col in controls.columns:
+            controls[col] = controls[col].astype("category")
+    return controls
+
+@st.cache_resource(show_spinner=False)
+def get_api_executor() -> ThreadPoolExecutor:
+    # Shared across reruns rather than built on every one
+    return ThreadPoolExecutor(max_workers=2)
+
+def call_api(fetch) -> Tuple[Optional[pd.DataFrame], Optional[Exception]]:
+    """Runs a MockAPI fetcher and returns (frame, None) or (None, error)."""
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        if isinstance(data, list):
-            return pd.json_normalize(data)
-        else:
-            return pd.DataFrame([data])
+        return fetch(), None
     except Exception as e:
-        st.error(f"❌ Could not fetch from API. Error: {e}")
+        return None, e
+
+def prefetch_api_data(need_inventory: bool) -> Dict[str, Tuple[Optional[pd.DataFrame], Optional[Exception]]]:
+    """Fetches the MockAPI controls (and inventory) concurrently so a cold page load waits on the slower call only."""
+    fetchers = {"controls": fetch_controls_from_api}
+    if need_inventory:
+        fetchers["inventory"] = load_inventory_from_api
+    if len(fetchers) == 1:
+        return {name: call_api(fetch) for name, fetch in fetchers.items()}
+    # Failures are not cached, so the outcomes are handed to the callers below
+    # rather than having them fetch (and time out) a second time
+    futures = {name: get_api_executor().submit(call_api, fetch) for name, fetch in fetchers.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+def fetch_inventory_from_api(outcome) -> pd.DataFrame:
+    inventory, error = outcome
+    if error is None:
+        return inventory
+    st.error(f"❌ Could not fetch from API. Error: {error}")
     st.stop()
 
 # --- Unified Uploads Dashboard Section ---
@@ -80,7 +160,7 @@ uploaded_file = st.file_uploader(
     help="You can upload multiple files at once. Each file will be processed based on its name (e.g., 'inventory' or 'dlp' in the filename)."
 )
 
-def parse_upload(upload) -> Dict[str, Any]:
+def parse_upload(upload, content_hash: str) -> Dict[str, Any]:
     """Parses a single uploaded file and returns its data and metadata."""
     if upload is None:
         return {}
@@ -100,56 +180,97 @@ def parse_upload(upload) -> Dict[str, Any]:
         
     try:
         if name.endswith(".csv"):
-            df = pd.read_csv(upload)
+            # Multithreaded native parser, fed straight from the upload's in-memory
+            # buffer so the bytes are not copied again on the way in.
+            # Empty cells become NaN and repeated headers get .1, .2 suffixes, as with
+            # pandas' own parser.
+            # Fall back to the default parser for CSVs pyarrow rejects.
+            try:
+                df = dedupe_columns(pacsv.read_csv(
+                    pa.BufferReader(upload.getbuffer()),
+                    convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+                ).to_pandas())
+            except Exception:
+                upload.seek(0)  # Rewind the file pointer
+                df = pd.read_csv(upload)
         elif name.endswith(".json"):
-            # Attempt to parse as a single JSON object
+            # Decode once, detecting UTF-8/16/32 (BOM or not) the way json.loads
+            # does for bytes; PowerShell exports, for instance, are UTF-16
+            data = upload.getvalue()
+            text = data.decode(json.detect_encoding(data))
+            # Attempt to parse as a single JSON object with pandas' bundled
+            # C ujson, which is several times faster than the stdlib parser
             try:
-                raw = json.load(upload)
+                try:
+                    raw = ujson_loads(text, precise_float=True)
+                except ValueError:
+                    # ujson rejects integers wider than 64 bits; the stdlib does not
+                    raw = json.loads(text)
                 df = pd.json_normalize(raw)
-            except json.JSONDecodeError:
-                # If it fails, try parsing line by line
-                upload.seek(0)  # Rewind the file pointer
-                data = [json.loads(line) for line in upload]
-                df = pd.json_normalize(data)
+            except ValueError:
+                # If it fails, parse as newline-delimited JSON in pandas' C parser,
+                # keeping values as decoded (e.g. "001" ids stay strings)
+                df = pd.read_json(io.StringIO(text), lines=True,
+                                  dtype=False, convert_dates=False)
 
         else:
             raise ValueError("Unsupported file type.")
 
-        return {
+        # pyarrow reads ISO-8601 strings with an offset (e.g. "...T10:00:00Z")
+        # as tz-aware datetimes, which the Excel report cannot write
+        df = drop_timezones(df)
+        if file_type == "Inventory":
+            df = normalize_network_segment(df)
+
+        entry = {
             "name": upload.name,
             "type": file_type,
             "size": upload.size,
-            "df": df,
-            "uploaded_at": pd.Timestamp.now()
+            "hash": content_hash,
         }
+        # Keep the frame as compact Arrow IPC (Feather) bytes in session state;
+        # upload_frame() rehydrates it when the pipeline needs it
+        try:
+            buffer = io.BytesIO()
+            df.to_feather(buffer)
+            entry["feather"] = buffer.getvalue()
+        except (ValueError, TypeError, OverflowError, pa.ArrowException):
+            # e.g. nested or mixed-type object columns, or integers wider than
+            # 64 bits, which Arrow cannot store
+            entry["df"] = df
+        return entry
     except Exception as e:
         st.error(f"Error parsing {upload.name}: {e}")
         return {}
 
+def upload_frame(entry: Dict[str, Any]) -> pd.DataFrame:
+    """Returns the DataFrame of a parsed upload."""
+    if "feather" in entry:
+        return pd.read_feather(io.BytesIO(entry["feather"]))
+    return entry["df"]
+
 def process_uploads(uploads: List[Any]):
     """Processes new uploads, adds them to session state, and identifies the latest of each type."""
     if not uploads:
         return None, None
     
-    # Add new uploads to the list
+    # The uploader replays every selected file on each rerun, so only parse
+    # content we have not seen; the latest of each type follows the current
+    # selection, so removing or re-adding a file changes which one is active
+    latest = {}
     for upload in uploads:
-        parsed_data = parse_upload(upload)
-        if parsed_data:
-            st.session_state.uploaded_files.append(parsed_data)
-    
-    # Find the latest inventory and DLP files
-    latest_inv_upload = None
-    latest_dlp_upload = None
-    
-    sorted_files = sorted(st.session_state.uploaded_files, key=lambda x: x['uploaded_at'], reverse=True)
-    
-    for f in sorted_files:
-        if f['type'] == "Inventory" and latest_inv_upload is None:
-            latest_inv_upload = f
-        elif f['type'] == "DLP Findings" and latest_dlp_upload is None:
-            latest_dlp_upload = f
-
-    return latest_inv_upload, latest_dlp_upload
+        # Hash the upload's buffer in place rather than a copy of its bytes
+        content_hash = hashlib.md5(upload.getbuffer()).hexdigest()
+        if content_hash not in st.session_state.uploaded_files:
+            parsed_data = parse_upload(upload, content_hash)
+            if not parsed_data:
+                continue
+            parsed_data["uploaded_at"] = pd.Timestamp.now()
+            st.session_state.uploaded_files[content_hash] = parsed_data
+        entry = st.session_state.uploaded_files[content_hash]
+        latest[entry["type"]] = entry
+
+    return latest.get("Inventory"), latest.get("DLP Findings")
 
 # Process uploads from the file uploader
 latest_inv_upload, latest_dlp_upload = process_uploads(uploaded_file)
@@ -157,47 +278,43 @@ latest_inv_upload, latest_dlp_upload = process_uploads(uploaded_file)
 # Display a table of previously uploaded files
 if st.session_state.uploaded_files:
     st.subheader("📝 Previously Uploaded Files")
-    files_to_display = []
-    for f in st.session_state.uploaded_files:
-        files_to_display.append({
-            "File Name": f["name"],
-            "File Type": f["type"],
-            "Size (KB)": round(f["size"] / 1024, 2),
-            "Uploaded At": f["uploaded_at"].strftime("%Y-%m-%d %H:%M:%S")
-        })
-    st.dataframe(pd.DataFrame(files_to_display), use_container_width=True)
-
-def parse_inventory_data(inv_data) -> pd.DataFrame:
+    files_to_display = pd.DataFrame(
+        list(st.session_state.uploaded_files.values()),
+        columns=["name", "type", "size", "uploaded_at"],
+    )
+    files_to_display["size"] = (files_to_display["size"] / 1024).round(2)
+    files_to_display["uploaded_at"] = files_to_display["uploaded_at"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    files_to_display.columns = ["File Name", "File Type", "Size (KB)", "Uploaded At"]
+    st.dataframe(files_to_display, use_container_width=True)
+
+def parse_inventory_data(inv_data, api_inventory=None) -> pd.DataFrame:
     # This function is now working as intended because inv_data will not be None
     # if an inventory file is successfully uploaded and detected by the corrected
     # `parse_upload` function.
     if inv_data is None:
-        return fetch_inventory_from_api()
-    return inv_data['df']
+        return fetch_inventory_from_api(api_inventory)
+    return upload_frame(inv_data)
 
 def merge_dlp_findings(inv_df: pd.DataFrame, dlp_data) -> pd.DataFrame:
-    df = inv_df.copy()
-    if "sensitive_found" not in df.columns:
-        df["sensitive_found"] = False
+    # assign() returns a new frame with just this column replaced, leaving the
+    # (possibly shared) input untouched without a full up-front copy
+    current = (inv_df["sensitive_found"] if "sensitive_found" in inv_df.columns
+               else pd.Series(False, index=inv_df.index))
     
     if dlp_data is None:
-        return df
+        return inv_df.assign(sensitive_found=current)
     
-    dlp = dlp_data['df']
+    dlp = upload_frame(dlp_data)
     if not {"asset_id", "sensitive_found"}.issubset(dlp.columns):
         st.warning("DLP file must have columns: asset_id, sensitive_found. Ignoring DLP upload.")
-        return df
-    df = df.merge(dlp[["asset_id", "sensitive_found"]],
-                  on="asset_id", how="left", suffixes=("", "_dlp"))
-    df["sensitive_found"] = df["sensitive_found_dlp"].fillna(df["sensitive_found"]).fillna(False)
-    return df.drop(columns=[c for c in df.columns if c.endswith("_dlp")])
-
-try:
-    inv_df = parse_inventory_data(latest_inv_upload)
-    inv_df = merge_dlp_findings(inv_df, latest_dlp_upload)
-except Exception as e:
-    st.error(f"Error loading data: {e}")
-    st.stop()
+        return inv_df.assign(sensitive_found=current)
+    # Only one column is overlaid, so look it up by asset_id instead of merging
+    # frames; any positive finding for an asset marks it sensitive. Rows without
+    # a value leave the inventory flag as it is.
+    reported = dlp.dropna(subset=["sensitive_found"])
+    findings = reported["sensitive_found"].astype(bool).groupby(reported["asset_id"]).any()
+    return inv_df.assign(sensitive_found=inv_df["asset_id"].map(findings)
+                         .combine_first(current).fillna(False).astype(bool))
 
 # ------------------------------
 # Scope Classifier
@@ -207,71 +324,102 @@ PCI_SCOPE_NOTE = (
     "and systems that can impact the security of the CDE, are in scope."
 )
 
+CHD_FLAG_COLUMNS = ["stores_chd", "processes_chd", "transmits_chd", "chd_present", "sensitive_found"]
+
 def classify_scope(inv_df: pd.DataFrame) -> pd.DataFrame:
-    df = inv_df.copy()
-    in_scope = (
-        df.get("stores_chd", False).fillna(False)
-        | df.get("processes_chd", False).fillna(False)
-        | df.get("transmits_chd", False).fillna(False)
-        | df.get("chd_present", False).fillna(False)
-        | df.get("sensitive_found", False).fillna(False)
-        | df.get("network_segment", "").astype(str).str.lower().isin(["cde", "dmz"])
+    # Normalise the CHD flags once: missing columns become False, nulls become False
+    flags = inv_df.reindex(columns=CHD_FLAG_COLUMNS, fill_value=False).fillna(False).astype(bool)
+    # network_segment is already a lower-cased categorical (normalize_network_segment)
+    seg = (inv_df["network_segment"] if "network_segment" in inv_df.columns
+           else pd.Series("", index=inv_df.index))
+
+    # One boolean column per reason phrase, in the order they are reported.
+    # Any reason puts an asset in scope, so the same matrix drives both columns.
+    phrases = np.array([
+        "stores CHD", "processes CHD", "transmits CHD", "CHD present",
+        "in cde segment", "in dmz segment", "DLP: sensitive data found",
+    ], dtype=object)
+    matrix = np.column_stack([
+        flags["stores_chd"].to_numpy(), flags["processes_chd"].to_numpy(),
+        flags["transmits_chd"].to_numpy(), flags["chd_present"].to_numpy(),
+        (seg == "cde").to_numpy(), (seg == "dmz").to_numpy(), flags["sensitive_found"].to_numpy(),
+    ])
+
+    # Encode each row's reasons as a bitmask; only the few distinct masks need a
+    # reason string, which is then broadcast back to the rows with one take
+    masks = matrix @ (1 << np.arange(len(phrases)))
+    unique_masks, row_to_mask = np.unique(masks, return_inverse=True)
+    texts = []
+    for mask in unique_masks:
+        selected = phrases[((mask >> np.arange(len(phrases))) & 1) == 1]
+        texts.append("In scope because " + ", ".join(selected) + "." if len(selected)
+                     else "Out of scope based on available data.")
+    scope_reason = np.asarray(texts, dtype=object)[row_to_mask.reshape(-1)]
+
+    # Add all derived columns in one assign() instead of copying the frame first
+    return inv_df.assign(
+        **{col: flags[col] for col in CHD_FLAG_COLUMNS},
+        in_scope=np.logical_or.reduce(matrix, axis=1),
+        scope_reason=scope_reason,
+        pci_scope_note=PCI_SCOPE_NOTE,
     )
-    df["in_scope"] = in_scope
-
-    def reason(row) -> str:
-        r = []
-        if row.get("stores_chd"): r.append("stores CHD")
-        if row.get("processes_chd"): r.append("processes CHD")
-        if row.get("transmits_chd"): r.append("transmits CHD")
-        if row.get("chd_present"): r.append("CHD present")
-        seg = str(row.get("network_segment", "")).lower()
-        if seg in ["cde", "dmz"]: r.append(f"in {seg} segment")
-        if row.get("sensitive_found"): r.append("DLP: sensitive data found")
-        return "In scope because " + ", ".join(r) + "." if r else "Out of scope based on available data."
-
-    df["scope_reason"] = df.apply(reason, axis=1)
-    df["pci_scope_note"] = PCI_SCOPE_NOTE
-    return df
 
-scoped_df = classify_scope(inv_df)
+@st.cache_data(ttl=300, max_entries=8, show_spinner=False)
+def run_scope_pipeline(inv_key, dlp_key, _inv_data, _dlp_data, _api_inventory=None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Runs inventory → DLP merge → scope, memoised on the uploads' content hashes."""
+    # Streamlit skips hashing the underscored arguments; the keys stand in for
+    # them (None = no upload, so the prefetched MockAPI inventory outcome is
+    # used, refreshed by the TTL)
+    inv_df = parse_inventory_data(_inv_data, _api_inventory)
+    inv_df = merge_dlp_findings(inv_df, _dlp_data)
+    return inv_df, classify_scope(inv_df)
+
+api_results = prefetch_api_data(need_inventory=latest_inv_upload is None)
+
+try:
+    inv_df, scoped_df = run_scope_pipeline(
+        latest_inv_upload["hash"] if latest_inv_upload else None,
+        latest_dlp_upload["hash"] if latest_dlp_upload else None,
+        latest_inv_upload,
+        latest_dlp_upload,
+        api_results.get("inventory"),
+    )
+except Exception as e:
+    st.error(f"Error loading data: {e}")
+    st.stop()
 
 # ------------------------------
 # Control Mapper
 # ------------------------------
-def build_control_matrix_from_api() -> pd.DataFrame:
-    url = MOCK_API_CONTROLS
-    try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        return pd.DataFrame(data)
-    except Exception as e:
-        st.error(f"❌ Could not fetch controls from API. Error: {e}")
-        return pd.DataFrame()
-
-control_df = build_control_matrix_from_api()
+def build_control_matrix_from_api(outcome) -> pd.DataFrame:
+    controls, error = outcome
+    if error is None:
+        return controls
+    st.error(f"❌ Could not fetch controls from API. Error: {error}")
+    return pd.DataFrame()
+
+control_df = build_control_matrix_from_api(api_results["controls"])
 # ------------------------------
 # Remediation Planner
 # ------------------------------
-def remediation_suggestion(row: pd.Series) -> str:
-    if row["req_id"] == "REQ-02" and not row["actual"]:
-        return "Enable TLS 1.2+; enforce HTTPS; disable weak ciphers."
-    if row["req_id"] == "REQ-03" and not row["actual"]:
-        return "Enable DB/disk encryption with KMS."
-    if row["req_id"] == "REQ-01" and not row["actual"]:
-        return "Apply firewall rules: default deny; allowlist only."
-    if row["req_id"] == "REQ-04" and not row["actual"]:
-        return "Enable audit logging; centralize logs (SIEM)."
-    return ""
-
+REMEDIATION_SUGGESTIONS = {
+    "REQ-01": "Apply firewall rules: default deny; allowlist only.",
+    "REQ-02": "Enable TLS 1.2+; enforce HTTPS; disable weak ciphers.",
+    "REQ-03": "Enable DB/disk encryption with KMS.",
+    "REQ-04": "Enable audit logging; centralize logs (SIEM).",
+}
+
+@st.cache_data(ttl=300, max_entries=8, show_spinner=False)
 def build_remediation(assets: pd.DataFrame, controls: pd.DataFrame) -> pd.DataFrame:
     if "status" not in controls.columns:
         return pd.DataFrame()
     gaps = controls[controls["status"] == "Gap"].copy()
     if gaps.empty:
         return pd.DataFrame()
-    gaps["remediation"] = gaps["title"].apply(remediation_suggestion)
+    suggestions = gaps["req_id"].map(REMEDIATION_SUGGESTIONS).astype(object).fillna("")
+    if "actual" in gaps.columns:
+        suggestions = suggestions.where(~gaps["actual"].fillna(False).astype(bool), "")
+    gaps["remediation"] = suggestions
     return gaps
 
 
@@ -280,18 +428,60 @@ remediation_df = build_remediation(scoped_df, control_df)
 # ------------------------------
 # Report Generator
 # ------------------------------
+@st.cache_data(ttl=600, max_entries=2, show_spinner=False)
 def build_excel_report(inventory, scoped, controls, remediation) -> bytes:
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+    # xlsxwriter serialises much faster than openpyxl; constant_memory is not
+    # used because pandas writes cells column by column, which that mode drops
+    with pd.ExcelWriter(output, engine="xlsxwriter",
+                        engine_kwargs={"options": {"strings_to_urls": False}}) as writer:
         inventory.to_excel(writer, index=False, sheet_name="Inventory")
         scoped.to_excel(writer, index=False, sheet_name="Scope")
         controls.to_excel(writer, index=False, sheet_name="Controls")
         remediation.to_excel(writer, index=False, sheet_name="Remediation")
     output.seek(0)
     return output.read()
+
+def summarize_report(scoped: pd.DataFrame, controls: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Returns the scope and in-scope control status summaries."""
+    # Not cached: two value_counts are cheaper than hashing the frames, and a
+    # key on the upload hashes alone would miss changes to the controls
+    scope_summary = scoped["in_scope"].value_counts(dropna=False).rename_axis("in_scope").reset_index(name="count")
+    in_scope_controls = controls[controls["in_scope"]]
+    # status is categorical, so drop the zero counts of unused categories
+    status_counts = in_scope_controls["status"].value_counts()
+    status_summary = status_counts[status_counts > 0].rename_axis("status").reset_index(name="count")
+    return scope_summary, status_summary
+
+@st.fragment
+def excel_download_section(inventory, scoped, controls, remediation):
+    # Only serialise the workbook once asked to; clicks here rerun just this fragment
+    if st.button("📄 Prepare Excel Report", key="prepare_excel_report"):
+        st.session_state.excel_requested = True
+    if st.session_state.get("excel_requested"):
+        try:
+            excel_bytes = build_excel_report(inventory, scoped, controls, remediation)
+        except Exception as e:
+            # Clear the request so the failure is not retried on every rerun
+            st.session_state.excel_requested = False
+            st.error(f"Could not build the Excel report: {e}")
+            return
+        st.download_button(
+            label="⬇️ Download Auditor-Ready Excel",
+            data=excel_bytes,
+            file_name="pci_dss_mvp_report.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
 # ------------------------------
 # Neo4j Push + Graph
 # ------------------------------
+@st.cache_resource(show_spinner=False)
+def get_neo4j_driver(uri, user, pwd):
+    # Reused across reruns so pushes skip the TCP/TLS/Bolt handshake; the driver
+    # module is only imported once the Knowledge Graph push is used
+    from neo4j import GraphDatabase
+    return GraphDatabase.driver(uri, auth=(user, pwd), max_connection_pool_size=10)
+
 def push_graph_to_neo4j(uri, user, pwd, database, inv, controls):
     def to_neo4j_ssc(u: str) -> str:
         if u.startswith("neo4j+s://"):
@@ -304,42 +494,60 @@ def push_graph_to_neo4j(uri, user, pwd, database, inv, controls):
             return u.replace("bolt+ssc://", "neo4j+ssc://")
         return u
 
+    def column(df: pd.DataFrame, col: str, default) -> pd.Series:
+        # Fill nulls only in the columns that are pushed, never on the whole frame
+        if col not in df.columns:
+            return pd.Series(default, index=df.index)
+        values = df[col]
+        # via object so categorical columns accept a default outside their categories
+        return values.astype(object).fillna(default) if values.hasnans else values
+
+    def merge_rows(tx, query, rows):
+        tx.run(query, rows=rows).consume()
+
     def try_push(target_uri: str):
-        driver = GraphDatabase.driver(target_uri, auth=(user, pwd))
+        driver = get_neo4j_driver(target_uri, user, pwd)
         # Lightweight connectivity check first
         with driver.session(database=database) as session:
             session.run("RETURN 1 AS ok").single()
             session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (a:Asset) REQUIRE a.asset_id IS UNIQUE")
             session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (c:Control) REQUIRE c.req_id IS UNIQUE")
 
-            for _, r in inv.iterrows():
-                session.run(
-                    """
-                    MERGE (a:Asset {asset_id:$id})
-                    SET a.name=$name, a.in_scope=$scope, a.segment=$seg, a.sensitive_found=$sens
-                    """,
-                    {
-                        "id": str(r.get("asset_id")),
-                        "name": str(r.get("name", "")),
-                        "scope": bool(r.get("in_scope", False)),
-                        "seg": str(r.get("network_segment", "")),
-                        "sens": bool(r.get("sensitive_found", False)),
-                    },
-                )
-
-            for _, r in controls.iterrows():
-                session.run(
-                    """
-                    MERGE (c:Control {req_id:$id})
-                    SET c.title=$title, c.status=$status
-                    """,
-                    {
-                        "id": str(r.get("req_id")),
-                        "title": str(r.get("title", "")),
-                        "status": str(r.get("status", "")),
-                    },
-                )
-        driver.close()
+            # One UNWIND per label: a single round-trip and transaction each,
+            # instead of one per row
+            asset_df = pd.DataFrame({
+                "id": column(inv, "asset_id", "").astype(str).str.strip(),
+                "name": column(inv, "name", "").astype(str),
+                "scope": column(inv, "in_scope", False).astype(bool),
+                "seg": column(inv, "network_segment", "").astype(str),
+                "sens": column(inv, "sensitive_found", False).astype(bool),
+            })
+            assets = asset_df[asset_df["id"] != ""].to_dict("records")
+            session.execute_write(
+                merge_rows,
+                """
+                UNWIND $rows AS r
+                MERGE (a:Asset {asset_id:r.id})
+                SET a.name=r.name, a.in_scope=r.scope, a.segment=r.seg, a.sensitive_found=r.sens
+                """,
+                assets,
+            )
+
+            ctrl_df = pd.DataFrame({
+                "id": column(controls, "req_id", "").astype(str).str.strip(),
+                "title": column(controls, "title", "").astype(str),
+                "status": column(controls, "status", "").astype(str),
+            })
+            control_rows = ctrl_df[ctrl_df["id"] != ""].to_dict("records")
+            session.execute_write(
+                merge_rows,
+                """
+                UNWIND $rows AS r
+                MERGE (c:Control {req_id:r.id})
+                SET c.title=r.title, c.status=r.status
+                """,
+                control_rows,
+            )
 
     # First attempt as-given
     try:
@@ -369,11 +577,11 @@ Troubleshooting tips:
 """)
         return False
 
-def render_popoto_html(uri, user, pwd, db="neo4j"):
-    return f"""
+POPOTO_TEMPLATE = """
     <!doctype html>
     <html>
       <head>
+        <link rel="preconnect" href="https://unpkg.com"/>
         <script src="https://unpkg.com/neo4j-driver"></script>
         <script src="https://unpkg.com/popotojs"></script>
         <link rel="stylesheet" href="https://unpkg.com/popotojs/dist/popoto.css"/>
@@ -381,14 +589,23 @@ def render_popoto_html(uri, user, pwd, db="neo4j"):
       <body>
         <div id="graph"></div>
         <script>
-          const driver = neo4j.driver("{uri}", neo4j.auth.basic("{user}", "{pwd}"));
+          const driver = neo4j.driver(__URI__, neo4j.auth.basic(__USER__, __PWD__));
           popoto.rest.driver = driver;
-          popoto.rest.database = "{db}";
+          popoto.rest.database = __DB__;
           popoto.start("graph", ["Asset"]);
         </script>
       </body>
     </html>
     """
+
+@st.cache_data(show_spinner=False)
+def render_popoto_html(uri, user, pwd, db="neo4j"):
+    # json.dumps yields properly escaped JS string literals, quotes included
+    return (POPOTO_TEMPLATE
+            .replace("__URI__", json.dumps(uri))
+            .replace("__USER__", json.dumps(user))
+            .replace("__PWD__", json.dumps(pwd))
+            .replace("__DB__", json.dumps(db)))
 # ------------------------------
 # Sidebar Menu
 # ------------------------------
@@ -470,24 +687,16 @@ elif menu == "Remediation Planner":
 
 elif menu == "Audit Report Generator":
     st.subheader("5️⃣ Audit Report Generator")
+    scope_summary, status_summary = summarize_report(scoped_df, control_df)
     c1, c2 = st.columns(2)
     with c1:
         st.subheader("Scope Summary")
-        scope_summary = scoped_df["in_scope"].value_counts(dropna=False).rename_axis("in_scope").reset_index(name="count")
         st.dataframe(scope_summary, use_container_width=True)
     with c2:
         st.subheader("Control Status (in-scope only)")
-        in_scope_controls = control_df[control_df["in_scope"]]
-        status_summary = in_scope_controls["status"].value_counts().rename_axis("status").reset_index(name="count")
         st.dataframe(status_summary, use_container_width=True)
 
-    excel_bytes = build_excel_report(inv_df, scoped_df, control_df, remediation_df)
-    st.download_button(
-        label="⬇️ Download Auditor-Ready Excel",
-        data=excel_bytes,
-        file_name="pci_dss_mvp_report.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+    excel_download_section(inv_df, scoped_df, control_df, remediation_df)
 
 # --- Chatbot Logic with UI Fixes ---
 
@@ -552,6 +761,13 @@ if st.session_state.chatbot_open:
                 with st.chat_message("user"):
                     st.markdown(prompt)
 
+            try:
+                chat_model = get_chat_model()
+            except Exception as e:
+                st.error(f"Failed to configure Google Generative AI: {e}")
+                st.info("Please add a valid Google API key to enable the chatbot functionality.")
+                chat_model = None
+
             # Generate and display assistant response
             if chat_model:
                 try:
@@ -561,10 +777,9 @@ if st.session_state.chatbot_open:
                                 prompt,
                                 stream=True
                             )
-                            full_response = ""
-                            for chunk in response_stream:
-                                full_response += chunk.text
-                                st.markdown(full_response + " ")
+                            # write_stream appends tokens incrementally instead of
+                            # re-rendering the whole reply for every chunk
+                            full_response = st.write_stream(chunk.text for chunk in response_stream)
                             st.session_state.messages.append({"role": "assistant", "content": full_response})
                 except Exception as e:
                     st.error(f"Error generating response: {e}")